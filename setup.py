@@ -1,8 +1,19 @@
+import os
+
 from setuptools import setup, find_packages
 
 with open("README.md", "r", encoding="utf-8") as fh:
     long_description = fh.read()
 
+# Optionally compile the parser module to a C extension with mypyc, e.g.
+#     DJANGO_QUERY_PARSER_USE_MYPYC=1 pip install .
+# Without it (the default), the pure-Python module is installed as usual.
+ext_modules = []
+if os.environ.get("DJANGO_QUERY_PARSER_USE_MYPYC") == "1":
+    from mypyc.build import mypycify
+
+    ext_modules = mypycify(["src/django_query_parser/parser.py"])
+
 setup(
     name="django-query-string-parser",
     version="0.1.1",
@@ -14,6 +25,7 @@ setup(
     url="https://github.com/sepehr-mohseni/django-query-string-parser",
     packages=find_packages(where="src"),
     package_dir={"": "src"},
+    ext_modules=ext_modules,
     classifiers=[
         "Development Status :: 3 - Alpha",
         "Intended Audience :: Developers",
@@ -35,7 +47,6 @@ setup(
     python_requires=">=3.8",
     install_requires=[
         "Django>=3.2",
-        "lark>=1.1.0",
     ],
     extras_require={
         "dev": [
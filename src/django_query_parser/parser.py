@@ -1,170 +1,308 @@
-from lark import Lark, Transformer, v_args
-from django.db.models import Q
-
-# --- 1. Define the Query Language Grammar (Lark EBNF) ---
-
-# The grammar defines the structure of the allowed query string.
-# Rules are lowercase (e.g., 'start'), Terminals are uppercase (e.g., 'NUMBER').
-QUERY_GRAMMAR = r"""
-    ?start: or_expr
-
-    // Operator Precedence: AND binds tighter than OR
-    ?or_expr: and_expr (OR and_expr)*
-    ?and_expr: comparison (AND comparison)*
-    ?comparison: term | "(" or_expr ")"
-
-    // Terminals: Basic building blocks of a comparison (e.g., field:value)
-    ?term: lookup_statement
-
-    lookup_statement: FIELD OPERATOR VALUE
-
-    // --- Terminals Definitions ---
-
-    // Logical Operators
-    AND: "AND" | "and"
-    OR: "OR" | "or"
-
-    // Comparison Operators (Longest matches first for safety)
-    OPERATOR: ">=" | "<=" | ">" | "<" | ":=" | ":" | "~=" | "!="
+import copy
+import re
+import sys
+from functools import lru_cache
+from typing import AbstractSet, Any, Dict, Iterable, List, Optional, Tuple, cast
 
-    // Field names must be snake_case identifiers
-    FIELD: /\w+/
-
-    // Values can be quoted strings or unquoted single words/numbers
-    VALUE: ESCAPED_STRING
-         | SIGNED_NUMBER
-         | UNQUOTED_VALUE
-         | "true" | "false" | "null"
-
-    UNQUOTED_VALUE: /\w+/
+from django.db.models import Q
 
-    // --- Imports and Configuration ---
-    %import common.ESCAPED_STRING
-    %import common.SIGNED_NUMBER
-    %import common.WS
-    %ignore WS
-"""
+# --- 1. Define the Query Language Tokenizer ---
+
+# The query language is small enough to be parsed by hand:
+#
+#     or_expr    := and_expr (OR and_expr)*
+#     and_expr   := comparison (AND comparison)*
+#     comparison := FIELD OPERATOR VALUE | "(" or_expr ")"
+#
+# Operator Precedence: AND binds tighter than OR.
+# Alternatives are ordered so that the longest operators match first, and
+# numbers only match when they are not the prefix of a longer word.
+_TOKEN_RE = re.compile(r"""
+    (?P<WS>\s+)
+  | (?P<LP>\()
+  | (?P<RP>\))
+  | (?P<OP>>=|<=|:=|~=|!=|[><:])
+  | (?P<STRING>"(?:[^"\\]|\\.)*")
+  | (?P<NUMBER>[+-]?(?:\d+(?:\.\d*)?|\.\d+)(?:[eE][+-]?\d+)?(?!\w))
+  | (?P<WORD>\w+)
+""", re.VERBOSE)
+
+# Maps query operators to a Django ORM lookup and whether to negate it
+_OP_TABLE = {
+    ">=": ("gte", False),
+    "<=": ("lte", False),
+    ">": ("gt", False),
+    "<": ("lt", False),
+    ":=": ("exact", False), # Treat as exact for simplicity
+    ":": ("exact", False),
+    "~=": ("icontains", False), # Case-insensitive containment
+    "!=": ("exact", True), # Exclusion, i.e. NOT exact
+}
+
+# Logical operators, only recognised between two comparisons
+_CONNECTORS = {"AND": "AND", "and": "AND", "OR": "OR", "or": "OR"}
+
+# A token is a (kind, value, position) tuple
+Token = Tuple[str, Any, int]
+
+# Human readable token names used in syntax error messages
+_TOKEN_NAMES = {
+    "FIELD": "a field name",
+    "OP": "an operator",
+    "VALUE": "a value",
+    "RP": "')'",
+    "END": "end of query",
+}
+
+
+def _tokenize(query_string: str, allowed_fields: Optional[AbstractSet[str]] = None) -> List[Token]:
+    """
+    Splits a query string into a list of (kind, value, position) tuples.
 
-# --- 2. Define the Transformer (Converts Tree to Django Q Object) ---
+    Words are classified by what precedes them, so that e.g. a field named
+    "order" or a value "and" are not mistaken for logical operators. Operator
+    tokens carry their (lookup_type, negate) entry from `_OP_TABLE` instead of
+    the raw text. The list always ends with an END token.
 
-@v_args(inline=True)    # Passes the children of the rule directly to the method
-class QueryTranslator(Transformer):
+    Fields are checked against `allowed_fields` as soon as they are seen, so
+    a query touching a disallowed field is rejected before any parsing.
+    """
+    tokens: List[Token] = []
+    prev = None
+    pos = 0
+    length = len(query_string)
+    while pos < length:
+        match = _TOKEN_RE.match(query_string, pos)
+        if match is None:
+            raise ValueError(
+                f"Unexpected character {query_string[pos]!r} at position {pos}."
+            )
+        # Every alternative of _TOKEN_RE is a named group
+        kind = cast(str, match.lastgroup)
+        text = match.group()
+        if kind != "WS":
+            value: Any = text
+            if kind == "OP":
+                value = _OP_TABLE[text]
+            elif prev == "OP" and kind in ("STRING", "NUMBER", "WORD"):
+                kind = "VALUE"
+            elif kind == "WORD":
+                if prev in ("VALUE", "RP") and text in _CONNECTORS:
+                    kind = _CONNECTORS[text]
+                else:
+                    kind = "FIELD"
+                    # Security Guardrail: Check if the field is whitelisted
+                    if allowed_fields and text not in allowed_fields:
+                        raise ValueError(f"Querying on field '{text}' is not allowed.")
+            tokens.append((kind, value, pos))
+            prev = kind
+        pos = match.end()
+    tokens.append(("END", "", length))
+    return tokens
+
+
+def _expect(tokens: List[Token], pos: int, kind: str) -> Any:
+    """Returns the value of the token at `pos`, raising if it is not of `kind`."""
+    token_kind, value, offset = tokens[pos]
+    if token_kind != kind:
+        found = _TOKEN_NAMES[token_kind] if token_kind in ("OP", "END") else repr(value)
+        raise ValueError(
+            f"Expected {_TOKEN_NAMES[kind]} at position {offset}, found {found}."
+        )
+    return value
+
+# --- 2. Define the Recursive-Descent Parser ---
+
+# Each function consumes tokens starting at `pos` and returns the resulting
+# Q object together with the position of the first unconsumed token. `depth`
+# counts the enclosing parentheses, so that deeply nested (user supplied)
+# queries are rejected before they exhaust the interpreter's recursion limit.
+_MAX_DEPTH = 100
+
+def _parse_or(
+    tokens: List[Token], pos: int, translator: "QueryTranslator", depth: int = 0
+) -> Tuple[Q, int]:
+    q_object, pos = _parse_and(tokens, pos, translator, depth)
+    if tokens[pos][0] != "OR":
+        return q_object, pos
+
+    # Fold the operands into one node as they are parsed, squashing children
+    # exactly like chained `|` would
+    result = Q(_connector=Q.OR)
+    result.add(q_object, Q.OR)
+    while tokens[pos][0] == "OR":
+        q_object, pos = _parse_and(tokens, pos + 1, translator, depth)
+        result.add(q_object, Q.OR)
+    return result, pos
+
+
+def _parse_and(
+    tokens: List[Token], pos: int, translator: "QueryTranslator", depth: int = 0
+) -> Tuple[Q, int]:
+    q_object, pos = _parse_atom(tokens, pos, translator, depth)
+    if tokens[pos][0] != "AND":
+        return q_object, pos
+
+    result = Q(_connector=Q.AND)
+    result.add(q_object, Q.AND)
+    while tokens[pos][0] == "AND":
+        q_object, pos = _parse_atom(tokens, pos + 1, translator, depth)
+        result.add(q_object, Q.AND)
+    return result, pos
+
+
+def _parse_atom(
+    tokens: List[Token], pos: int, translator: "QueryTranslator", depth: int = 0
+) -> Tuple[Q, int]:
+    if tokens[pos][0] == "LP":
+        if depth >= _MAX_DEPTH:
+            raise ValueError(
+                f"Query nested too deeply at position {tokens[pos][2]} "
+                f"(at most {_MAX_DEPTH} levels of parentheses are allowed)."
+            )
+        q_object, pos = _parse_or(tokens, pos + 1, translator, depth + 1)
+        _expect(tokens, pos, "RP")
+        return q_object, pos + 1
+
+    field = _expect(tokens, pos, "FIELD")
+    lookup_type, negate = _expect(tokens, pos + 1, "OP")
+    value = _expect(tokens, pos + 2, "VALUE")
+    return translator.lookup_statement(field, lookup_type, negate, value), pos + 3
+
+# --- 3. Define the Translator (Converts Tokens to Django Q Object) ---
+
+# Keyword values, matched case-insensitively
+_LITERALS = {"true": True, "false": False, "null": None}
+_SENTINEL = object()
+
+# Backslash escapes understood inside quoted strings; others are kept as is
+_ESCAPES = {'"': '"', "\\": "\\", "n": "\n", "t": "\t"}
+_ESCAPE_RE = re.compile(r'\\(["\\nt])')
+
+# Numeric values, classified up front instead of trying int()/float() in turn
+_INT_RE = re.compile(r"[+-]?\d+\Z")
+_FLOAT_RE = re.compile(r"[+-]?(?:(?:\d+\.\d*|\.\d+)(?:[eE][+-]?\d+)?|\d+[eE][+-]?\d+)\Z")
+
+class QueryTranslator:
     """
-    Transforms the parsed Lark Tree into a Django Q object.
+    Translates a tokenized query string into a Django Q object.
     """
 
-    # Maps query operators to Django ORM lookups
-    OPERATOR_MAP = {
-        ":": "exact",
-        ":=": "exact", # Treat as exact for simplicity
-        "~=": "icontains", # Case-insensitive containment
-        "!=": "exclude__exact", # Handled later, but useful mapping
-        ">": "gt",
-        "<": "lt",
-        ">=": "gte",
-        "<=": "lte",
-    }
-
-    def __init__(self, allowed_fields=None):
+    # Translators are long-lived and read on every comparison; slots keep
+    # attribute access cheap and the instances small
+    __slots__ = ("allowed_fields", "_lookup_keys")
+
+    def __init__(self, allowed_fields: Optional[Iterable[str]] = None) -> None:
         """
         Initialize with a set of allowed fields for security.
         """
-        self.allowed_fields = set(allowed_fields) if allowed_fields else None
-        super().__init__()
-
-    # --- Logical Combination Methods ---
-
-    def or_expr(self, *args):
-        # Combines the results of the OR-separated expressions with Q | (OR)
-        # Filter out Token objects (the AND/OR terminals) and keep only Q objects
-        q_objects = [arg for arg in args if isinstance(arg, Q)]
-        if not q_objects:
-            return Q()
-        if len(q_objects) == 1:
-            return q_objects[0]
-        result = q_objects[0]
-        for q_obj in q_objects[1:]:
-            result = result | q_obj
-        return result
-
-    def and_expr(self, *args):
-        # Combines the results of the AND-separated expressions with Q & (AND)
-        # Filter out Token objects (the AND/OR terminals) and keep only Q objects
-        q_objects = [arg for arg in args if isinstance(arg, Q)]
-        if not q_objects:
-            return Q()
-        if len(q_objects) == 1:
-            return q_objects[0]
-        result = q_objects[0]
-        for q_obj in q_objects[1:]:
-            result = result & q_obj
-        return result
+        # Immutable, so it is safe to share across threads and cheap to hash
+        self.allowed_fields = frozenset(allowed_fields) if allowed_fields else None
+
+        # With a whitelist the possible "field__lookup" keys are known up
+        # front, so build (and intern) them once instead of on every lookup
+        self._lookup_keys: Optional[Dict[Tuple[str, str], str]] = None
+        if self.allowed_fields:
+            lookup_types = {lookup_type for lookup_type, _ in _OP_TABLE.values()}
+            self._lookup_keys = {
+                (field, lookup_type): sys.intern(f"{field}__{lookup_type}")
+                for field in self.allowed_fields
+                for lookup_type in lookup_types
+            }
+
+    # Translators are stateless between parses, so two translators with the
+    # same whitelist are interchangeable (and share cached results)
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, QueryTranslator):
+            return NotImplemented
+        return self.allowed_fields == other.allowed_fields
+
+    def __hash__(self) -> int:
+        # frozenset caches its own hash after the first call
+        return hash(self.allowed_fields)
+
+    def transform(self, tokens: List[Token]) -> Q:
+        """
+        Parses the tokens produced by `_tokenize` into a single Q object.
+
+        The tokens must have been produced with the same `allowed_fields`, as
+        the whitelist is enforced by the tokenizer.
+        """
+        q_object, pos = _parse_or(tokens, 0, self)
+        _expect(tokens, pos, "END")
+        return q_object
 
     # --- Leaf Node/Comparison Methods ---
 
-    def lookup_statement(self, field_token, operator_token, value_token):
-        field = str(field_token)
-        operator = str(operator_token)
-        value = self._clean_value(str(value_token))
+    def lookup_statement(self, field: str, lookup_type: str, negate: bool, raw_value: str) -> Q:
+        # The tokenizer already enforces the whitelist; a missing key only
+        # happens for tokens produced without it
+        if self._lookup_keys:
+            lookup = self._lookup_keys.get((field, lookup_type))
+            if lookup is None:
+                raise ValueError(f"Querying on field '{field}' is not allowed.")
+        else:
+            lookup = f"{field}__{lookup_type}"
+
+        q_object = Q(**{lookup: self._clean_value(raw_value, lookup_type)})
+        # Exclusion (!=) returns a Q object that negates the result (NOT Q)
+        return ~q_object if negate else q_object
+
+    def _clean_value(self, raw_value: str, lookup_type: str = "exact") -> Any:
+        """Clean and convert the raw token value."""
+        # Strip quotes from strings (the tokenizer guarantees the closing one)
+        if raw_value[:1] == '"':
+            text = raw_value[1:-1]
+            if "\\" in text:
+                text = _ESCAPE_RE.sub(lambda match: _ESCAPES[match.group(1)], text)
+            return text
 
-        # Security Guardrail: Check if the field is whitelisted
-        if self.allowed_fields and field not in self.allowed_fields:
-            raise ValueError(f"Querying on field '{field}' is not allowed.")
+        # Containment is a text search, so keep e.g. `code~=42` as a string
+        if lookup_type == "icontains":
+            return raw_value
 
-        # Special handling for exclusion (!=)
-        if operator == "!=":
-            lookup = f"{field}__{self.OPERATOR_MAP.get(':')}" # Default to exact
-            # Returns a Q object that negates the result (NOT Q)
-            return ~Q(**{lookup: value})
+        # Convert simple types
+        value = _LITERALS.get(raw_value.lower(), _SENTINEL)
+        if value is not _SENTINEL:
+            return value
 
-        # Standard handling
-        lookup_type = self.OPERATOR_MAP.get(operator)
-        if not lookup_type:
-             raise ValueError(f"Unsupported operator '{operator}' in query.")
+        # Convert to int/float only if it looks like a number
+        if _INT_RE.match(raw_value):
+            return int(raw_value)
+        if _FLOAT_RE.match(raw_value):
+            return float(raw_value)
 
-        lookup = f"{field}__{lookup_type}"
-        return Q(**{lookup: value})
+        # Fallback to the raw string
+        return raw_value
 
-    def _clean_value(self, raw_value):
-        """Clean and convert the raw token value."""
-        # Strip quotes from strings
-        if raw_value.startswith('"') and raw_value.endswith('"'):
-            return raw_value.strip('"')
+# --- 4. Result Cache ---
 
-        # Convert simple types
-        if raw_value.lower() == 'true':
-            return True
-        if raw_value.lower() == 'false':
-            return False
-        if raw_value.lower() == 'null':
-            return None
-
-        # Attempt to convert to float/int if it looks like a number
-        try:
-            return int(raw_value)
-        except ValueError:
-            try:
-                return float(raw_value)
-            except ValueError:
-                # Fallback to the raw string
-                return raw_value.replace("\\n", "\n").replace("\\t", "\t")
-
-    # Pass through other tokens (FIELD, OPERATOR, etc.) directly as strings
-    FIELD = str
-    OPERATOR = str
-    VALUE = str
-    UNQUOTED_VALUE = str
-    ESCAPED_STRING = str
-
-# --- 3. Public Interface Class ---
+@lru_cache(maxsize=512)
+def _parse_cached(query_string: str, translator: QueryTranslator) -> Q:
+    """
+    Parses and translates a query string, memoizing the resulting Q object.
+
+    Filter strings tend to repeat across paginated requests and sessions, so a
+    cache hit skips the whole parse/transform pipeline. The cached Q object is
+    shared and must never be handed out directly; callers copy it first.
+
+    Translators compare equal by whitelist, so results are shared between
+    parsers configured with the same allowed fields.
+    """
+    tokens = _tokenize(query_string, translator.allowed_fields)
+    return translator.transform(tokens)
+
+# --- 5. Public Interface Class ---
 
 class DjangoQueryParser:
     """
     The main interface for developers. Parses a query string into a Django Q object.
     """
-    def __init__(self, allowed_fields=None):
-        self.parser = Lark(QUERY_GRAMMAR, parser='lalr')
-        self.allowed_fields = allowed_fields
+    def __init__(self, allowed_fields: Optional[Iterable[str]] = None) -> None:
+        self.allowed_fields = frozenset(allowed_fields) if allowed_fields else None
+        # The translator holds no per-parse state, so one instance is reused
+        # for every call (and across threads)
+        self._translator = QueryTranslator(allowed_fields=allowed_fields)
 
     def parse(self, query_string: str) -> Q:
         """
@@ -174,15 +312,30 @@ class DjangoQueryParser:
             return Q() # Return an empty Q object if the string is empty
 
         try:
-            # 1. Parse the string into a syntax tree
-            tree = self.parser.parse(query_string)
+            # Parse and transform (or fetch from cache)
+            q_object = _parse_cached(query_string, self._translator)
+        except ValueError as e:
+            # Syntax and whitelist errors are raised as ValueError; wrap them
+            # for clarity and let anything else (i.e. bugs) propagate as is
+            raise ValueError(f"Invalid query string: {e}") from e
 
-            # 2. Transform the tree into a Django Q object
-            translator = QueryTranslator(allowed_fields=self.allowed_fields)
-            q_object = translator.transform(tree)
+        # Hand out a copy because Q objects are mutable via .add()
+        return copy.deepcopy(q_object)
 
-            return q_object
+    def parse_many(self, query_strings: Iterable[str]) -> List[Q]:
+        """
+        Parses several query strings, e.g. saved filters loaded at startup.
 
-        except Exception as e:
-            # Catch parsing/translation errors and wrap them for clarity
+        Equivalent to calling `parse` on each string, but the whole batch runs
+        under a single error handler. Raises ValueError on the first invalid
+        query string.
+        """
+        translator = self._translator
+        try:
+            q_objects = [
+                _parse_cached(query, translator) if query else Q() for query in query_strings
+            ]
+        except ValueError as e:
             raise ValueError(f"Invalid query string: {e}") from e
+
+        return [copy.deepcopy(q_object) for q_object in q_objects]
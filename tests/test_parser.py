@@ -2,7 +2,8 @@
 
 import pytest
 from django.db.models import Q
-from django_query_parser import DjangoQueryParser
+from django_query_parser import DjangoQueryParser, QueryTranslator
+from django_query_parser.parser import _parse_cached, _tokenize
 
 
 class TestBasicParsing:
@@ -75,6 +76,26 @@ class TestValueTypes:
         q = self.parser.parse('price:99.99')
         assert q == Q(price__exact=99.99)
 
+    def test_float_value_with_exponent(self):
+        """Test parsing floats in scientific notation"""
+        q = self.parser.parse('price:1.5e3')
+        assert q == Q(price__exact=1500.0)
+
+    def test_alphanumeric_value_stays_string(self):
+        """Test that values starting with digits are not converted"""
+        q = self.parser.parse('code:123abc')
+        assert q == Q(code__exact='123abc')
+
+    def test_contains_keeps_numbers_as_strings(self):
+        """Test that ~= does not convert unquoted values"""
+        q = self.parser.parse('code~=42')
+        assert q == Q(code__icontains='42')
+
+    def test_contains_keeps_keywords_as_strings(self):
+        """Test that ~= does not convert true/false/null"""
+        q = self.parser.parse('name~=null')
+        assert q == Q(name__icontains='null')
+
     def test_boolean_true(self):
         """Test parsing boolean true"""
         q = self.parser.parse('is_active:true')
@@ -95,6 +116,16 @@ class TestValueTypes:
         q = self.parser.parse('name:"John Doe"')
         assert q == Q(name__exact='John Doe')
 
+    def test_quoted_string_with_escaped_quotes(self):
+        """Test that escaped quotes inside quoted strings are kept"""
+        q = self.parser.parse(r'title:"he said \"hi\""')
+        assert q == Q(title__exact='he said "hi"')
+
+    def test_quoted_string_with_escapes(self):
+        """Test backslash escapes inside quoted strings"""
+        q = self.parser.parse(r'path:"C:\\temp\tdir\x"')
+        assert q == Q(path__exact='C:\\temp\tdir\\x')
+
     def test_unquoted_string(self):
         """Test parsing unquoted strings"""
         q = self.parser.parse('status:active')
@@ -140,6 +171,17 @@ class TestLogicalOperators:
                    Q(priority__exact=10))
         assert q == expected
 
+    def test_long_chain_is_flat(self):
+        """Test that a chain of ORs yields one node holding only the comparisons"""
+        q = self.parser.parse('status:a OR status:b OR status:c OR status:d')
+        assert q.connector == Q.OR
+        assert q.children == [
+            ('status__exact', 'a'),
+            ('status__exact', 'b'),
+            ('status__exact', 'c'),
+            ('status__exact', 'd'),
+        ]
+
     def test_parentheses_grouping(self):
         """Test grouping with parentheses"""
         q = self.parser.parse('(status:active OR status:pending) AND priority:5')
@@ -175,6 +217,18 @@ class TestSecurity:
         with pytest.raises(ValueError, match="not allowed"):
             parser.parse('status:active AND secret_field:value')
 
+    def test_disallowed_field_rejected_before_syntax_errors(self):
+        """Test that disallowed fields are reported even in malformed queries"""
+        parser = DjangoQueryParser(allowed_fields={'status', 'priority'})
+        with pytest.raises(ValueError, match="not allowed"):
+            parser.parse('secret_field:value AND (status')
+
+    def test_translator_rejects_disallowed_field(self):
+        """Test that QueryTranslator enforces its whitelist on foreign tokens"""
+        translator = QueryTranslator(allowed_fields={'status'})
+        with pytest.raises(ValueError, match="not allowed"):
+            translator.transform(_tokenize('secret_field:value'))
+
     def test_no_whitelist_allows_all(self):
         """Test that no whitelist allows all fields"""
         parser = DjangoQueryParser()  # No whitelist
@@ -233,12 +287,37 @@ class TestErrorHandling:
         with pytest.raises(ValueError, match="Invalid query string"):
             self.parser.parse('(status:active')
 
+    def test_deeply_nested_parentheses(self):
+        """Test that nesting up to the limit is accepted"""
+        q = self.parser.parse('(' * 100 + 'status:active' + ')' * 100)
+        assert q == Q(status__exact='active')
+
+    def test_too_deeply_nested_parentheses(self):
+        """Test that excessive nesting raises ValueError, not RecursionError"""
+        with pytest.raises(ValueError, match="nested too deeply"):
+            self.parser.parse('(' * 400 + 'status:active' + ')' * 400)
+
+    def test_unbalanced_deep_parentheses(self):
+        """Test that a long run of opening parentheses raises ValueError"""
+        with pytest.raises(ValueError, match="nested too deeply"):
+            self.parser.parse('(' * 5000)
+
+    def test_deep_nesting_is_invalid_query_string(self):
+        """Test that excessive nesting is reported like any invalid query"""
+        with pytest.raises(ValueError, match="Invalid query string"):
+            self.parser.parse('(' * 5000 + 'status:active' + ')' * 5000)
+
     def test_invalid_operator(self):
         """Test that parser handles operator validation"""
         # The grammar should not allow invalid operators
         with pytest.raises(ValueError, match="Invalid query string"):
             self.parser.parse('status&active')
 
+    def test_missing_logical_operator(self):
+        """Test that adjacent comparisons without AND/OR raise error"""
+        with pytest.raises(ValueError, match="Invalid query string"):
+            self.parser.parse('status:active priority:5')
+
 
 class TestEdgeCases:
     """Test edge cases and boundary conditions"""
@@ -276,3 +355,74 @@ class TestEdgeCases:
         """Test that whitespace is handled correctly"""
         q = self.parser.parse('name:"John   Doe"')
         assert q == Q(name__exact='John   Doe')
+
+    def test_logical_keyword_as_field_and_value(self):
+        """Test that AND/OR are only treated as operators between comparisons"""
+        q = self.parser.parse('order:5 AND word:and')
+        assert q == Q(order__exact=5) & Q(word__exact='and')
+
+
+class TestBatchParsing:
+    """Test parsing several query strings at once"""
+
+    def setup_method(self):
+        """Set up test fixtures"""
+        self.parser = DjangoQueryParser(allowed_fields={'status', 'priority'})
+
+    def test_parse_many(self):
+        """Test that parse_many matches parse for each query"""
+        queries = ['status:active', '', 'status:active OR priority>=5']
+        assert self.parser.parse_many(queries) == [self.parser.parse(q) for q in queries]
+
+    def test_parse_many_accepts_iterables(self):
+        """Test that parse_many consumes any iterable"""
+        q_objects = self.parser.parse_many(q for q in ['priority:1', 'priority:2'])
+        assert q_objects == [Q(priority__exact=1), Q(priority__exact=2)]
+
+    def test_parse_many_disallowed_field(self):
+        """Test that a disallowed field in the batch raises a wrapped ValueError"""
+        with pytest.raises(ValueError, match="Invalid query string: .*not allowed"):
+            self.parser.parse_many(['status:active', 'secret_field:value'])
+
+    def test_parse_many_invalid_syntax(self):
+        """Test that invalid syntax in the batch raises a wrapped ValueError"""
+        with pytest.raises(ValueError, match="Invalid query string"):
+            self.parser.parse_many(['status:active', 'status:active AND'])
+
+
+class TestCaching:
+    """Test memoization of parsed queries"""
+
+    def setup_method(self):
+        """Set up test fixtures"""
+        _parse_cached.cache_clear()
+
+    def test_repeated_parse_hits_cache(self):
+        """Test that parsing the same query twice is served from the cache"""
+        parser = DjangoQueryParser()
+        first = parser.parse('status:active AND priority>5')
+        second = parser.parse('status:active AND priority>5')
+        assert _parse_cached.cache_info().hits == 1
+        assert first == second
+
+    def test_cached_result_is_not_shared(self):
+        """Test that mutating a returned Q object does not leak into the cache"""
+        parser = DjangoQueryParser()
+        first = parser.parse('status:active')
+        first.add(Q(priority__exact=1), Q.AND)
+        second = parser.parse('status:active')
+        assert second == Q(status__exact='active')
+
+    def test_parse_many_result_is_not_shared(self):
+        """Test that mutating a batch result does not leak into the cache"""
+        parser = DjangoQueryParser()
+        [first] = parser.parse_many(['status:active'])
+        first.add(Q(priority__exact=1), Q.AND)
+        assert parser.parse_many(['status:active']) == [Q(status__exact='active')]
+
+    def test_cache_respects_whitelist(self):
+        """Test that a cached query is still checked against another whitelist"""
+        DjangoQueryParser().parse('secret_field:value')
+        parser = DjangoQueryParser(allowed_fields={'status'})
+        with pytest.raises(ValueError, match="not allowed"):
+            parser.parse('secret_field:value')